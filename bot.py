@@ -8,33 +8,108 @@ packages) to make Docker deployment and imports straightforward.
 import asyncio
 import logging
 import sys
+from typing import Dict, Set
 
-from aiogram import Bot, Dispatcher
+from aiogram import BaseMiddleware, Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import BOT_TOKEN
-from database import init_db
-from monitoring import resume_tasks_on_start, fic_monitor_tasks
-from playwright_manager import stop_playwright
+from config import BOT_TOKEN, MAX_CONCURRENT_UPDATES
+from database import init_db, close_db
 
-import common
-import registration
-import grades
-import settings
+
+# Updates a single chat may have waiting behind its running handler; past
+# this the chat is flooding and further updates are dropped.
+CHAT_QUEUE_MAX = 50
+
+
+class ChatOrderMiddleware(BaseMiddleware):
+    """Handle each chat's updates in arrival order.
+
+    Polling runs updates as concurrent tasks, each holding one of aiogram's
+    `tasks_concurrency_limit` slots. Each chat gets a queue drained by its own
+    worker, so an update waiting behind its chat's slow handler returns its
+    slot straight away instead of parking on it; `concurrency` is then
+    enforced here, and only while a handler actually runs. A chat's worker
+    exits once its queue is empty.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def __call__(self, handler, event, data):
+        chat = data.get("event_chat")
+        if chat is None:
+            async with self._slots:
+                return await handler(event, data)
+
+        queue = self._queues.get(chat.id)
+        if queue is None:
+            queue = self._queues[chat.id] = asyncio.Queue(CHAT_QUEUE_MAX)
+            t = asyncio.create_task(self._drain(chat.id, queue))
+            self._workers.add(t)
+            t.add_done_callback(self._workers.discard)
+        try:
+            queue.put_nowait((handler, event, data))
+        except asyncio.QueueFull:
+            logging.warning("Dropping update for chat %s: %d already queued", chat.id, CHAT_QUEUE_MAX)
+
+    async def _drain(self, chat_id: int, queue: asyncio.Queue) -> None:
+        try:
+            while True:
+                try:
+                    handler, event, data = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                async with self._slots:
+                    try:
+                        await handler(event, data)
+                    except Exception:
+                        logging.exception("Update handler failed in chat %s", chat_id)
+        finally:
+            if self._queues.get(chat_id) is queue:
+                del self._queues[chat_id]
+
+    async def close(self) -> None:
+        """Cancel queued and running chat workers (on shutdown)."""
+        workers = list(self._workers)
+        for t in workers:
+            t.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _close_quietly(coro) -> None:
+    try:
+        await coro
+    except Exception:
+        pass
 
 
 async def main() -> None:
     """Application entry point."""
     await init_db()
 
+    # Handlers and monitoring pull in Playwright; import them once the DB is ready
+    # so a broken DB setup fails fast without paying for that import tree.
+    from monitoring import resume_tasks_on_start, stop_monitoring
+    from playwright_manager import stop_playwright
+
+    import common
+    import registration
+    import grades
+    import settings
+
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
 
     dp = Dispatcher(storage=MemoryStorage())
+    chat_order = ChatOrderMiddleware(MAX_CONCURRENT_UPDATES)
+    dp.update.outer_middleware(chat_order)
 
     # Routers
     dp.include_router(registration.router)
@@ -47,22 +122,20 @@ async def main() -> None:
         await resume_tasks_on_start(bot)
 
         # Start polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await dp.start_polling(
+            bot,
+            allowed_updates=dp.resolve_used_update_types(),
+            tasks_concurrency_limit=MAX_CONCURRENT_UPDATES,
+        )
     finally:
         logging.info("Shutting down…")
-        tasks = list(fic_monitor_tasks.values())
-        for t in tasks:
-            if not t.done():
-                t.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
-        try:
-            await stop_playwright()
-        except Exception:
-            pass
-        try:
-            await bot.session.close()
-        except Exception:
-            pass
+        await chat_order.close()
+        await stop_monitoring()
+        # Independent teardown steps; run them side by side.
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_close_quietly(stop_playwright()))
+            tg.create_task(_close_quietly(bot.session.close()))
+            tg.create_task(_close_quietly(close_db()))
         logging.info("Shutdown complete.")
 
 
@@ -1,4 +1,8 @@
 # common.py
+import asyncio
+import time
+from typing import Dict, Tuple
+
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -6,30 +10,73 @@ from aiogram.types import Message, CallbackQuery
 
 import keyboards
 import database as db
-from monitoring import ensure_fic_task, cancel_task_safely, fic_monitor_tasks
+from constants import MAIN_MENU_HEADER, MAIN_MENU_FOOTER, MY_GRADES_TITLE
+from monitoring import ensure_fic_task, stop_fic_task
 from utils import format_dt_vancouver, safe_edit, _short_err, _localize_known_error
 
 router = Router()
 
+FALLBACK_TEXT = "Available commands: /start, /mygrades, /status, /stop, /start_monitor, /delete"
 
-async def _notifications_line(uid: int) -> str:
-    rec = await db.get_user(uid)
-    fic_st = await db.get_fic_state(uid)
+# Answer unrecognised text at most once per FALLBACK_MIN_INTERVAL_SEC per chat,
+# so a flood of messages does not turn into a flood of replies.
+FALLBACK_MIN_INTERVAL_SEC = 2.0
+# Once this many chats are tracked, expired entries are swept out.
+FALLBACK_TRACK_MAX = 10_000
+_fallback_sent_at: Dict[int, float] = {}
+
+# Menu navigation comes in bursts (Back -> Main -> ...); reuse a rendered
+# header for a couple of seconds. Handlers that change what it shows call
+# invalidate_notifications_line().
+NOTIF_LINE_TTL_SEC = 2.0
+NOTIF_LINE_CACHE_MAX = 10_000
+_notif_line_cache: Dict[int, Tuple[float, str]] = {}
+
+
+def invalidate_notifications_line(uid: int) -> None:
+    _notif_line_cache.pop(uid, None)
+
+
+def _field(st: dict | None, key: str):
+    """st[key] for an optional state dict; None when the state or key is missing."""
+    return st.get(key) if st else None
+
+
+def _render_notifications_line(rec: db.UserRow | None, fic_st: dict | None) -> str:
     return (
-        f"<b>FIC:</b> {'on 🔔' if rec and rec.get('fic_active') else 'off 🔕'} | "
-        f"Update: {format_dt_vancouver((fic_st or {}).get('updated_at'))}\n"
+        f"<b>FIC:</b> {'on 🔔' if rec and rec.fic_active else 'off 🔕'} | "
+        f"Update: {format_dt_vancouver(_field(fic_st, 'updated_at'))}\n"
     )
 
 
+async def _notifications_line(uid: int) -> str:
+    now = time.monotonic()
+    hit = _notif_line_cache.get(uid)
+    if hit is not None and now - hit[0] < NOTIF_LINE_TTL_SEC:
+        return hit[1]
+
+    found = await db.get_user_notif_with_fic_state(uid)
+    text = _render_notifications_line(*(found or (None, None)))
+
+    if len(_notif_line_cache) >= NOTIF_LINE_CACHE_MAX:
+        # Drop expired entries so the cache stays bounded.
+        for k in [k for k, (ts, _) in _notif_line_cache.items() if now - ts >= NOTIF_LINE_TTL_SEC]:
+            del _notif_line_cache[k]
+        if len(_notif_line_cache) >= NOTIF_LINE_CACHE_MAX:
+            _notif_line_cache.clear()
+    _notif_line_cache[uid] = (now, text)
+    return text
+
+
 @router.message(Command("start"))
 async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
     uid = message.from_user.id
-    rec = await db.get_user(uid)
+    rec = await db.get_user_notif(uid)
     if rec:
         text = await _notifications_line(uid)
         await message.answer(
-            "🏠 <b>Main menu</b>\n" + text + "\n<b>Choose a section:</b>",
+            MAIN_MENU_HEADER + text + MAIN_MENU_FOOTER,
             reply_markup=keyboards.kb_main_menu(),
         )
     else:
@@ -47,7 +94,7 @@ async def cb_back_main(callback: CallbackQuery):
     text = await _notifications_line(uid)
     await safe_edit(
         callback.message,
-        text=("🏠 <b>Main menu</b>\n" + text + "\n<b>Choose a section:</b>"),
+        text=MAIN_MENU_HEADER + text + MAIN_MENU_FOOTER,
         reply_markup=keyboards.kb_main_menu(),
     )
 
@@ -55,31 +102,33 @@ async def cb_back_main(callback: CallbackQuery):
 @router.callback_query(F.data == "menu:mygrades")
 async def cb_menu_mygrades(callback: CallbackQuery):
     await callback.answer()
-    await safe_edit(callback.message, text="📚 <b>My Grades</b>:", reply_markup=keyboards.kb_my_grades_menu())
+    await safe_edit(callback.message, text=MY_GRADES_TITLE, reply_markup=keyboards.kb_my_grades_menu())
 
 
 @router.message(Command("status"))
 async def cmd_status(message: Message):
     uid = message.from_user.id
-    rec = await db.get_user(uid)
-    if not rec:
+    found = await db.get_user_notif_with_fic_state(uid)
+    if not found:
         await message.answer("Please /start and register first.")
         return
+    rec, fic_st = found
 
-    fic_st = await db.get_fic_state(uid)
     lines = []
-    if fic_st.get("last_error"):
-        lines.append(f"⚠️ <b>FIC problem:</b> {_short_err(_localize_known_error(fic_st['last_error']))}")
+    err = _field(fic_st, "last_error")
+    if err:
+        lines.append(f"⚠️ <b>FIC problem:</b> {_short_err(_localize_known_error(err))}")
 
-    lines.append((await _notifications_line(uid)).rstrip())
+    lines.append(_render_notifications_line(rec, fic_st).rstrip())
     await message.answer("\n".join(lines))
 
 
 @router.message(Command("stop"))
 async def cmd_stop(message: Message):
     uid = message.from_user.id
-    await cancel_task_safely(fic_monitor_tasks.get(uid))
-    await db.set_fic_active(uid, False)
+    # Unscheduling and clearing the flag are independent; do them side by side.
+    await asyncio.gather(stop_fic_task(uid), db.set_fic_active(uid, False))
+    invalidate_notifications_line(uid)
     await message.answer("🔕 Notifications are OFF (FIC).")
 
 
@@ -90,10 +139,23 @@ async def cmd_start_monitor(message: Message, bot: Bot):
         await message.answer("Please /start and register first.")
         return
     await db.set_fic_active(uid, True)
+    invalidate_notifications_line(uid)
     ensure_fic_task(bot, uid)
     await message.answer("✅ Notifications are ON (FIC).")
 
 
 @router.message(F.text)
 async def fallback(message: Message):
-    await message.answer("Available commands: /start, /mygrades, /status, /stop, /start_monitor, /delete")
+    now = time.monotonic()
+    chat_id = message.chat.id
+    last = _fallback_sent_at.get(chat_id)
+    if last is not None and now - last < FALLBACK_MIN_INTERVAL_SEC:
+        return
+
+    if len(_fallback_sent_at) >= FALLBACK_TRACK_MAX:
+        for k in [k for k, ts in _fallback_sent_at.items() if now - ts >= FALLBACK_MIN_INTERVAL_SEC]:
+            del _fallback_sent_at[k]
+        if len(_fallback_sent_at) >= FALLBACK_TRACK_MAX:
+            _fallback_sent_at.clear()
+    _fallback_sent_at[chat_id] = now
+    await message.answer(FALLBACK_TEXT)
@@ -1,7 +1,11 @@
 # config.py
+import base64
 import os
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 load_dotenv()
 
@@ -11,6 +15,13 @@ FERNET_KEY = os.getenv("FERNET_KEY")
 # How often to check grades (seconds)
 CHECK_INTERVAL_SEC = int(os.getenv("CHECK_INTERVAL_SEC", "600"))
 
+# How many grade checks may run at the same time (portal logins in flight).
+MAX_CONCURRENT_CHECKS = int(os.getenv("MAX_CONCURRENT_CHECKS", "8"))
+
+# Upper bound for the check interval while a user's grades stay unchanged
+# (monitoring backs off from CHECK_INTERVAL_SEC towards this value).
+MAX_CHECK_INTERVAL_SEC = int(os.getenv("MAX_CHECK_INTERVAL_SEC", "7200"))
+
 # Notifications auto-off window (days).
 # When a user enables grade notifications, they stay enabled only for this duration
 # and then turn off automatically.
@@ -19,6 +30,14 @@ NOTIF_DURATION_DAYS = int(os.getenv("NOTIF_DURATION_DAYS", "14"))
 # How long before auto-off to send a warning message (days).
 NOTIF_WARN_BEFORE_DAYS = int(os.getenv("NOTIF_WARN_BEFORE_DAYS", "1"))
 
+# Derived windows in seconds (computed once).
+NOTIF_DURATION_SEC = NOTIF_DURATION_DAYS * 86400
+NOTIF_WARN_BEFORE_SEC = max(0, NOTIF_WARN_BEFORE_DAYS) * 86400
+
+# Max number of Telegram updates handled concurrently while polling.
+# Each update runs in its own task so a slow handler never stalls getUpdates.
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "256"))
+
 # SQLite DB path (inside Docker you can map it to /data/bot.db via volume)
 DB_PATH = os.getenv("DB_PATH", "bot.db")
 
@@ -27,4 +46,15 @@ if not BOT_TOKEN:
 if not FERNET_KEY:
     raise RuntimeError("FERNET_KEY is not set")
 
+# Credentials are sealed with AES-256-GCM under a key derived from FERNET_KEY
+# (HKDF-SHA256), so the Fernet keys themselves are never reused as a GCM key.
+# The Fernet instance is kept only to read values stored by older versions.
 fernet = Fernet(FERNET_KEY)
+aesgcm = AESGCM(
+    HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"fic-grade-bot/aesgcm-v1",
+    ).derive(base64.urlsafe_b64decode(FERNET_KEY))
+)
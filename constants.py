@@ -7,3 +7,8 @@ LOGOUT_URL = f"{BASE}/user/logout"
 
 # Final grades page
 GRADES_URL = f"{BASE}/student/resulttab"
+
+# Bot screens shared by several routers
+MAIN_MENU_HEADER = "🏠 <b>Main menu</b>\n"
+MAIN_MENU_FOOTER = "\n<b>Choose a section:</b>"
+MY_GRADES_TITLE = "📚 <b>My Grades</b>:"
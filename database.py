@@ -1,15 +1,19 @@
 # database.py
 from __future__ import annotations
 
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Optional
+from typing import NamedTuple, Optional
+import os
 import time
 import math
 
 import aiosqlite
+from aiosqlitepool import SQLiteConnectionPool
 
-from config import DB_PATH, fernet, NOTIF_DURATION_DAYS
+from config import DB_PATH, aesgcm, fernet, NOTIF_DURATION_SEC
 
 # ====== SCHEMA ======
 
@@ -37,34 +41,209 @@ CREATE TABLE IF NOT EXISTS fic_state (
 );
 """
 
+# Stored in PRAGMA user_version; bump it when adding a migration to init_db().
+SCHEMA_VERSION = 1
+
+# Monitoring only ever looks up users with notifications ON.
+CREATE_IDX_USERS_FIC_ACTIVE = """
+CREATE INDEX IF NOT EXISTS idx_users_fic_active ON users(fic_active) WHERE fic_active=1;
+"""
+
+
+# ====== STATEMENTS ======
+# Kept as constants so every call sends the exact same SQL text and hits
+# sqlite3's per-connection prepared-statement cache on pooled connections.
+
+UPSERT_CREDENTIALS = """
+INSERT INTO users (user_id, login_enc, password_enc, fic_active, fic_active_until, fic_warned, created_at, updated_at)
+VALUES (?, ?, ?, 1, ?, 0, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    login_enc=excluded.login_enc,
+    password_enc=excluded.password_enc,
+    fic_active=excluded.fic_active,
+    fic_active_until=excluded.fic_active_until,
+    fic_warned=excluded.fic_warned,
+    updated_at=excluded.updated_at
+"""
+
+SELECT_USER = "SELECT * FROM users WHERE user_id=?"
+SELECT_USER_NOTIF = "SELECT user_id, fic_active, fic_active_until, fic_warned FROM users WHERE user_id=?"
+SELECT_USER_NOTIF_WITH_FIC_STATE = """
+SELECT u.user_id, u.fic_active, u.fic_active_until, u.fic_warned,
+       fs.last_hash, fs.last_snapshot, fs.updated_at, fs.last_error
+FROM users u LEFT JOIN fic_state fs ON fs.user_id = u.user_id
+WHERE u.user_id=?
+"""
+SELECT_USER_CREDENTIALS = "SELECT login_enc, password_enc FROM users WHERE user_id=?"
+SELECT_LEGACY_CREDENTIALS = """
+SELECT user_id, login_enc, password_enc FROM users
+WHERE substr(login_enc, 1, 1) != x'01' OR substr(password_enc, 1, 1) != x'01'
+"""
+UPDATE_CREDENTIALS = "UPDATE users SET login_enc=?, password_enc=? WHERE user_id=?"
+SELECT_ACTIVE_USER_IDS = "SELECT user_id FROM users WHERE fic_active=1"
+DELETE_USER = "DELETE FROM users WHERE user_id=?"
+
+SELECT_FIC_STATE = "SELECT * FROM fic_state WHERE user_id=?"
+SELECT_FIC_HASHES = "SELECT user_id, last_hash FROM fic_state WHERE last_hash IS NOT NULL"
+DELETE_FIC_STATE = "DELETE FROM fic_state WHERE user_id=?"
+
+UPSERT_FIC_SNAPSHOT = """
+INSERT INTO fic_state (user_id, last_snapshot, last_hash, updated_at, last_error)
+VALUES (?, ?, ?, ?, NULL)
+ON CONFLICT(user_id) DO UPDATE SET
+    last_snapshot=excluded.last_snapshot,
+    last_hash=excluded.last_hash,
+    updated_at=excluded.updated_at,
+    last_error=NULL
+"""
+
+UPSERT_FIC_ERROR = """
+INSERT INTO fic_state (user_id, last_error, updated_at)
+VALUES (?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    last_error=excluded.last_error,
+    updated_at=excluded.updated_at
+"""
+
+UPDATE_FIC_ACTIVE = "UPDATE users SET fic_active=?, fic_active_until=?, fic_warned=?, updated_at=? WHERE user_id=?"
+UPDATE_FIC_WARNED = "UPDATE users SET fic_warned=?, updated_at=? WHERE user_id=?"
+UPDATE_FIC_UNTIL_MISSING = """
+UPDATE users SET fic_active_until=?, fic_warned=0, updated_at=?
+WHERE fic_active=1 AND fic_active_until IS NULL
+"""
+
+# sqlite3 defaults to 128 cached statements per connection.
+STATEMENT_CACHE_SIZE = 256
+
 
 # ====== CONNECTION HELPERS ======
 
+# Long-lived connection pool, created by init_db() and closed by close_db().
+POOL: SQLiteConnectionPool | None = None
+# SQLite allows one writer at a time; see tx().
+_write_lock = asyncio.Lock()
+
+# user_id -> fic_state.last_hash as last written by this process, so identical
+# snapshots are not rewritten. Warmed by init_db().
+_fic_hash_cache: dict[int, str] = {}
+
+# user_id -> UserRow / decrypted (login, password) as last read, dropped by
+# every write to that user's row. A read only fills a cache if no write was
+# invalidated while it ran (tracked by the epoch), so a slow reader cannot
+# put a stale row back.
+_user_cache: dict[int, UserRow] = {}
+_credentials_cache: dict[int, tuple[str, str]] = {}
+_user_cache_epoch = 0
+
+# (unix second, ISO string) of the last _utcnow_iso() result.
+_iso_cache: tuple[int, str] = (-1, "")
+
+
+async def _connection_factory() -> aiosqlite.Connection:
+    """Open a pooled connection; per-connection PRAGMAs are applied once here."""
+    db = await aiosqlite.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE)
+    db.row_factory = aiosqlite.Row
+    # WAL lets monitoring reads proceed while a write is in flight;
+    # synchronous=NORMAL is safe under WAL and saves an fsync per commit.
+    await db.execute("PRAGMA journal_mode=WAL;")
+    await db.execute("PRAGMA synchronous=NORMAL;")
+    await db.execute("PRAGMA busy_timeout=5000;")
+    await db.execute("PRAGMA temp_store=MEMORY;")
+    await db.execute("PRAGMA cache_size=-64000;")
+    await db.execute("PRAGMA mmap_size=268435456;")
+    await db.execute("PRAGMA wal_autocheckpoint=1000;")
+    await db.execute("PRAGMA journal_size_limit=6144000;")
+    await db.execute("PRAGMA foreign_keys=ON;")
+    return db
+
+
 @asynccontextmanager
 async def get_db():
-    db = await aiosqlite.connect(DB_PATH)
-    await db.execute("PRAGMA foreign_keys=ON;")
-    try:
+    if POOL is None:
+        raise RuntimeError("Database is not initialized; call init_db() first")
+    async with POOL.connection() as db:
         yield db
-    finally:
-        await db.close()
+
+
+@asynccontextmanager
+async def tx():
+    """Run statements as one write transaction (one WAL commit).
+
+    Writers queue on an in-process lock instead of spinning in SQLite's
+    busy handler while another pooled connection holds the write lock.
+    """
+    async with _write_lock, get_db() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
 
 
 async def init_db() -> None:
+    global POOL
+    if POOL is None:
+        POOL = SQLiteConnectionPool(_connection_factory)
+
     async with get_db() as db:
         await db.execute(CREATE_USERS)
         await db.execute(CREATE_FIC_STATE)
 
         # --- lightweight migrations for existing DBs ---
-        cur = await db.execute("PRAGMA table_info(users)")
-        cols = {row[1] async for row in cur}  # row[1] = column name
+        cur = await db.execute("PRAGMA user_version")
+        (version,) = await cur.fetchone()
+        if version < SCHEMA_VERSION:
+            cur = await db.execute("PRAGMA table_info(users)")
+            cols = {row[1] for row in await cur.fetchall()}  # row[1] = column name
+
+            if "fic_active_until" not in cols:
+                await db.execute("ALTER TABLE users ADD COLUMN fic_active_until INTEGER")
+            if "fic_warned" not in cols:
+                await db.execute("ALTER TABLE users ADD COLUMN fic_warned INTEGER NOT NULL DEFAULT 0")
+
+            await db.execute(CREATE_IDX_USERS_FIC_ACTIVE)
+            await db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        await db.commit()
 
-        if "fic_active_until" not in cols:
-            await db.execute("ALTER TABLE users ADD COLUMN fic_active_until INTEGER")
-        if "fic_warned" not in cols:
-            await db.execute("ALTER TABLE users ADD COLUMN fic_warned INTEGER NOT NULL DEFAULT 0")
+        # Refresh planner statistics so the partial index is picked up.
+        await db.execute("ANALYZE")
         await db.commit()
 
+        cur = await db.execute(SELECT_FIC_HASHES)
+        _fic_hash_cache.clear()
+        _fic_hash_cache.update((row[0], row[1]) for row in await cur.fetchall())
+
+    await _reseal_legacy_credentials()
+
+
+async def close_db() -> None:
+    """Close all pooled connections (call on shutdown)."""
+    global POOL
+    if POOL is not None:
+        # Refresh planner stats if they drifted, then fold the WAL back into
+        # the main file so it does not linger on disk.
+        async with get_db() as db:
+            await db.execute("PRAGMA optimize;")
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        await POOL.close()
+        POOL = None
+
+
+def _utcnow_iso(ts: float | None = None) -> str:
+    """ISO-8601 UTC timestamp for `ts` (defaults to now), at second precision.
+
+    Writes come in bursts, so the string is formatted once per second.
+    """
+    global _iso_cache
+    sec = int(time.time() if ts is None else ts)
+    cached_sec, iso = _iso_cache
+    if sec != cached_sec:
+        iso = datetime.fromtimestamp(sec, tz=timezone.utc).isoformat()
+        _iso_cache = (sec, iso)
+    return iso
+
 
 def _days_left_from_until(until_ts: int | None) -> int | None:
     """Return whole days left until unix timestamp (ceil)."""
@@ -77,94 +256,190 @@ def _days_left_from_until(until_ts: int | None) -> int | None:
 
 # ====== USER CREDENTIALS ======
 
-async def save_credentials(user_id: int, login: str, password: str) -> None:
-    now = datetime.now(timezone.utc).isoformat()
-    now_ts = int(time.time())
-    login_enc = fernet.encrypt(login.encode())
-    password_enc = fernet.encrypt(password.encode())
-    until_ts = now_ts + NOTIF_DURATION_DAYS * 86400
+# Blob layout: 1-byte version tag + 12-byte nonce + AES-GCM ciphertext/tag.
+# Legacy Fernet tokens are base64 text and always start with "g", never 0x01.
+_AESGCM_TAG = b"\x01"
+_NONCE_LEN = 12
+
+
+def _encrypt_secret(value: str) -> bytes:
+    nonce = os.urandom(_NONCE_LEN)
+    return _AESGCM_TAG + nonce + aesgcm.encrypt(nonce, value.encode(), None)
+
+
+def _decrypt_secret(blob: bytes) -> str:
+    if blob[:1] == _AESGCM_TAG:
+        nonce = blob[1:1 + _NONCE_LEN]
+        return aesgcm.decrypt(nonce, blob[1 + _NONCE_LEN:], None).decode()
+    return fernet.decrypt(blob).decode()
+
+
+def decrypt_credentials(rec: aiosqlite.Row | dict) -> tuple[str, str]:
+    """Return (login, password) from a users row."""
+    return _decrypt_secret(rec["login_enc"]), _decrypt_secret(rec["password_enc"])
+
+
+def _reseal(rows: list) -> list[tuple[bytes, bytes, int]]:
+    out = []
+    for row in rows:
+        try:
+            login, password = decrypt_credentials(row)
+        except Exception as e:
+            # Corrupt blob or rotated key: leave the row for its own monitor to
+            # report, rather than failing startup for everyone.
+            logging.warning("Cannot reseal credentials of user %s: %r", row["user_id"], e)
+            continue
+        out.append((_encrypt_secret(login), _encrypt_secret(password), row["user_id"]))
+    return out
+
 
+async def _reseal_legacy_credentials() -> None:
+    """Re-encrypt Fernet blobs from older versions with AES-GCM, once, off the event loop."""
     async with get_db() as db:
+        cur = await db.execute(SELECT_LEGACY_CREDENTIALS)
+        rows = await cur.fetchall()
+    if not rows:
+        return
+    updates = await asyncio.to_thread(_reseal, rows)
+    if not updates:
+        return
+    async with tx() as db:
+        await db.executemany(UPDATE_CREDENTIALS, updates)
+
+
+class UserRow(NamedTuple):
+    """Notification flags of a user, without the credential blobs."""
+    user_id: int
+    fic_active: int
+    fic_active_until: Optional[int]
+    fic_warned: int
+
+
+def _invalidate_user(user_id: int | None = None) -> None:
+    """Forget the cached row of `user_id` (of every user if None)."""
+    global _user_cache_epoch
+    _user_cache_epoch += 1
+    if user_id is None:
+        _user_cache.clear()
+        _credentials_cache.clear()
+    else:
+        _user_cache.pop(user_id, None)
+        _credentials_cache.pop(user_id, None)
+
+
+async def save_credentials(user_id: int, login: str, password: str) -> None:
+    t = time.time()
+    now = _utcnow_iso(t)
+    now_ts = int(t)
+    login_enc = _encrypt_secret(login)
+    password_enc = _encrypt_secret(password)
+    until_ts = now_ts + NOTIF_DURATION_SEC
+
+    async with tx() as db:
         await db.execute(
-            """
-            INSERT INTO users (user_id, login_enc, password_enc, fic_active, fic_active_until, fic_warned, created_at, updated_at)
-            VALUES (?, ?, ?, 1, ?, 0, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                login_enc=excluded.login_enc,
-                password_enc=excluded.password_enc,
-                fic_active=excluded.fic_active,
-                fic_active_until=excluded.fic_active_until,
-                fic_warned=excluded.fic_warned,
-                updated_at=excluded.updated_at
-            """,
+            UPSERT_CREDENTIALS,
             (user_id, login_enc, password_enc, until_ts, now, now),
         )
-        await db.commit()
+    _invalidate_user(user_id)
 
 
 async def get_user(user_id: int) -> Optional[dict]:
     async with get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        cur = await db.execute(SELECT_USER, (user_id,))
         row = await cur.fetchone()
         return dict(row) if row else None
 
 
-def fic_notif_days_left(rec: dict | None) -> int | None:
-    if not rec or not rec.get("fic_active"):
+async def get_user_notif(user_id: int) -> Optional[UserRow]:
+    """Lightweight get_user() for callers that only need the notification flags."""
+    rec = _user_cache.get(user_id)
+    if rec is not None:
+        return rec
+    epoch = _user_cache_epoch
+    async with get_db() as db:
+        cur = await db.execute(SELECT_USER_NOTIF, (user_id,))
+        row = await cur.fetchone()
+    if not row:
         return None
-    return _days_left_from_until(rec.get("fic_active_until"))
+    rec = UserRow(*row)
+    if epoch == _user_cache_epoch:
+        _user_cache[user_id] = rec
+    return rec
 
 
-async def delete_user_data(user_id: int) -> None:
+async def get_user_notif_with_fic_state(user_id: int) -> Optional[tuple[UserRow, dict]]:
+    """get_user_notif() plus the user's fic_state columns, in one query."""
+    epoch = _user_cache_epoch
     async with get_db() as db:
-        await db.execute("DELETE FROM fic_state WHERE user_id=?", (user_id,))
-        await db.execute("DELETE FROM users WHERE user_id=?", (user_id,))
-        await db.commit()
+        cur = await db.execute(SELECT_USER_NOTIF_WITH_FIC_STATE, (user_id,))
+        row = await cur.fetchone()
+    if not row:
+        return None
+    rec = UserRow(*row[:4])
+    if epoch == _user_cache_epoch:
+        _user_cache[user_id] = rec
+    return rec, {
+        "last_hash": row[4],
+        "last_snapshot": row[5],
+        "updated_at": row[6],
+        "last_error": row[7],
+    }
+
+
+async def get_credentials(user_id: int) -> Optional[tuple[str, str]]:
+    """Return the decrypted (login, password) of a user, or None if not registered."""
+    creds = _credentials_cache.get(user_id)
+    if creds is not None:
+        return creds
+    epoch = _user_cache_epoch
+    async with get_db() as db:
+        cur = await db.execute(SELECT_USER_CREDENTIALS, (user_id,))
+        row = await cur.fetchone()
+    if not row:
+        return None
+    creds = decrypt_credentials(row)
+    if epoch == _user_cache_epoch:
+        _credentials_cache[user_id] = creds
+    return creds
+
+
+def fic_notif_days_left(rec: UserRow | None) -> int | None:
+    if not rec or not rec.fic_active:
+        return None
+    return _days_left_from_until(rec.fic_active_until)
+
+
+async def delete_user_data(user_id: int) -> None:
+    async with tx() as db:
+        await db.execute(DELETE_FIC_STATE, (user_id,))
+        await db.execute(DELETE_USER, (user_id,))
+    _fic_hash_cache.pop(user_id, None)
+    _invalidate_user(user_id)
 
 
 # ====== FIC STATE ======
 
 async def get_fic_state(user_id: int) -> dict:
     async with get_db() as db:
-        db.row_factory = aiosqlite.Row
-        cur = await db.execute("SELECT * FROM fic_state WHERE user_id=?", (user_id,))
+        cur = await db.execute(SELECT_FIC_STATE, (user_id,))
         row = await cur.fetchone()
         return dict(row) if row else {}
 
 
 async def update_fic_snapshot(user_id: int, snapshot_json: str, h: str) -> None:
-    now = datetime.now(timezone.utc).isoformat()
-    async with get_db() as db:
-        await db.execute(
-            """
-            INSERT INTO fic_state (user_id, last_snapshot, last_hash, updated_at, last_error)
-            VALUES (?, ?, ?, ?, NULL)
-            ON CONFLICT(user_id) DO UPDATE SET
-                last_snapshot=excluded.last_snapshot,
-                last_hash=excluded.last_hash,
-                updated_at=excluded.updated_at,
-                last_error=NULL
-            """,
-            (user_id, snapshot_json, h, now),
-        )
-        await db.commit()
+    """Store a new snapshot; a no-op if it matches the last stored hash."""
+    if _fic_hash_cache.get(user_id) == h:
+        return
+    now = _utcnow_iso()
+    async with tx() as db:
+        await db.execute(UPSERT_FIC_SNAPSHOT, (user_id, snapshot_json, h, now))
+    _fic_hash_cache[user_id] = h
 
 
 async def set_fic_error(user_id: int, err: Optional[str]) -> None:
-    now = datetime.now(timezone.utc).isoformat()
-    async with get_db() as db:
-        await db.execute(
-            """
-            INSERT INTO fic_state (user_id, last_error, updated_at)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                last_error=excluded.last_error,
-                updated_at=excluded.updated_at
-            """,
-            (user_id, err, now),
-        )
-        await db.commit()
+    now = _utcnow_iso()
+    async with tx() as db:
+        await db.execute(UPSERT_FIC_ERROR, (user_id, err, now))
 
 
 # ====== MONITORING TOGGLES ======
@@ -175,42 +450,42 @@ async def set_fic_active(user_id: int, active: bool) -> None:
     When enabling, notifications are enabled for NOTIF_DURATION_DAYS and
     will auto-disable afterwards.
     """
-    now_iso = datetime.now(timezone.utc).isoformat()
-    now_ts = int(time.time())
+    t = time.time()
+    now_iso = _utcnow_iso(t)
+    now_ts = int(t)
 
     fic_active = 1 if active else 0
-    until_ts = (now_ts + NOTIF_DURATION_DAYS * 86400) if active else None
+    until_ts = (now_ts + NOTIF_DURATION_SEC) if active else None
     warned = 0
 
-    async with get_db() as db:
+    async with tx() as db:
         await db.execute(
-            "UPDATE users SET fic_active=?, fic_active_until=?, fic_warned=?, updated_at=? WHERE user_id=?",
+            UPDATE_FIC_ACTIVE,
             (fic_active, until_ts, warned, now_iso, user_id),
         )
-        await db.commit()
+    _invalidate_user(user_id)
 
 
 async def set_fic_warned(user_id: int, warned: bool) -> None:
-    async with get_db() as db:
+    async with tx() as db:
         await db.execute(
-            "UPDATE users SET fic_warned=?, updated_at=? WHERE user_id=?",
-            (1 if warned else 0, datetime.now(timezone.utc).isoformat(), user_id),
+            UPDATE_FIC_WARNED,
+            (1 if warned else 0, _utcnow_iso(), user_id),
         )
-        await db.commit()
+    _invalidate_user(user_id)
 
 
-async def ensure_fic_until_set(user_id: int) -> None:
-    """If user has notifications ON but no expiry timestamp (older DB), set it."""
-    rec = await get_user(user_id)
-    if not rec or not bool(rec.get("fic_active")):
-        return
-    if rec.get("fic_active_until"):
-        return
-    now_ts = int(time.time())
-    until_ts = now_ts + NOTIF_DURATION_DAYS * 86400
-    async with get_db() as db:
+async def ensure_fic_until_set_bulk() -> None:
+    """Set an expiry timestamp for every user with notifications ON but none yet (older DB).
+
+    Runs once at startup as a single UPDATE, so per-user code paths can rely on
+    `fic_active_until` being set whenever `fic_active` is.
+    """
+    t = time.time()
+    until_ts = int(t) + NOTIF_DURATION_SEC
+    async with tx() as db:
         await db.execute(
-            "UPDATE users SET fic_active_until=?, fic_warned=0, updated_at=? WHERE user_id=?",
-            (until_ts, datetime.now(timezone.utc).isoformat(), user_id),
+            UPDATE_FIC_UNTIL_MISSING,
+            (until_ts, _utcnow_iso(t)),
         )
-        await db.commit()
+    _invalidate_user()
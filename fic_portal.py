@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Dict
 from urllib.parse import urlsplit, parse_qs
 
@@ -62,6 +63,10 @@ class FICClient:
         await self.login(username, password)
         resp = await self.sess.req.get(GRADES_URL)
         html = await resp.text()
-        data = parse_results(html)
-        await self.logout()
+        # Parse in a worker thread so concurrent checks keep the event loop free,
+        # and log out meanwhile: the two are independent.
+        data, _ = await asyncio.gather(
+            asyncio.to_thread(parse_results, html),
+            self.logout(),
+        )
         return data
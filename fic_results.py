@@ -1,35 +1,39 @@
 from typing import Dict
-from bs4 import BeautifulSoup
+
+from lxml import etree, html as lxml_html
+
+# Rows of the first tbody of the first "data-table", compiled once at import.
+_ROW_XPATH = etree.XPath(
+    "(//table[contains(concat(' ', normalize-space(@class), ' '), ' data-table ')])[1]"
+    "/descendant::tbody[1]/descendant::tr"
+)
+
+
+def _clean(el) -> str:
+    # text_content() concatenates the cell's text in C; only the ends need trimming.
+    return (el.text_content() or "").strip()
+
 
 def parse_results(html: str, empty_grade: str = "") -> Dict[str, Dict[str, str]]:
     """
     Parser for the "Results" table on learning.fraseric.ca.
     Returns: {semester: {course_code: grade}}
     """
-
-    def clean(x) -> str:
-        return (x or "").strip()
-
-
-    soup = BeautifulSoup(html, "html.parser")
-    table = soup.find("table", class_="data-table")
     result: Dict[str, Dict[str, str]] = {}
-
-    if not table:
-        return result
-
-    tbody = table.find("tbody")
-    if not tbody:
+    try:
+        doc = lxml_html.fromstring(html)
+    except etree.ParserError:
+        # Empty or whitespace-only document.
         return result
 
-    for tr in tbody.find_all("tr"):
-        tds = tr.find_all("td")
+    for tr in _ROW_XPATH(doc):
+        tds = list(tr.iter("td"))
         if len(tds) < 5:
             continue
 
-        semester = clean(tds[0].get_text())
-        code = clean(tds[1].get_text())
-        grade = clean(tds[4].get_text())
+        semester = _clean(tds[0])
+        code = _clean(tds[1])
+        grade = _clean(tds[4])
 
 
         if not semester or not code:
@@ -40,4 +44,4 @@ def parse_results(html: str, empty_grade: str = "") -> Dict[str, Dict[str, str]]
 
         result.setdefault(semester, {})[code] = grade
 
-    return result
\ No newline at end of file
+    return result
@@ -8,7 +8,7 @@ from aiogram.types import Message, CallbackQuery
 import keyboards
 import database as db
 import messages
-from config import fernet
+from constants import MY_GRADES_TITLE
 from grades_service import GradesService
 from playwright_manager import get_playwright_instance
 from utils import safe_edit, normalize_snapshot, compute_hash, _short_err, _localize_known_error
@@ -25,11 +25,10 @@ async def get_cached_fic_grades_map(user_id: int) -> dict:
 
 
 async def fetch_fic_grades_map(user_id: int) -> dict:
-    rec = await db.get_user(user_id)
-    if not rec:
+    creds = await db.get_credentials(user_id)
+    if not creds:
         return {}
-    login = fernet.decrypt(rec["login_enc"]).decode()
-    password = fernet.decrypt(rec["password_enc"]).decode()
+    login, password = creds
 
     shared_pw = await get_playwright_instance()
     svc = GradesService(shared_pw=shared_pw)
@@ -44,7 +43,7 @@ async def fetch_fic_grades_map(user_id: int) -> dict:
 @router.callback_query(F.data == "back:mygrades")
 async def cb_back_mygrades(callback: CallbackQuery):
     await callback.answer()
-    await safe_edit(callback.message, text="📚 <b>My Grades</b>:", reply_markup=keyboards.kb_my_grades_menu())
+    await safe_edit(callback.message, text=MY_GRADES_TITLE, reply_markup=keyboards.kb_my_grades_menu())
 
 
 @router.message(Command("mygrades"))
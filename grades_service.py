@@ -26,4 +26,9 @@ class GradesService:
         await self.session.close()
 
     async def fic_final_grades(self, username: str, password: str) -> Dict[str, Dict[str, str]]:
-        return await self.fic.get_final_grades(username, password)
+        try:
+            return await self.fic.get_final_grades(username, password)
+        finally:
+            # Every fetch logs in from scratch, so don't keep the request context
+            # (cookie jar, sockets) alive while a monitor sleeps between polls.
+            await self.session.close()
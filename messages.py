@@ -17,49 +17,59 @@ GPA / repeat logic implemented here follows SFU's Spring 2026 calendar:
 from __future__ import annotations
 
 import re
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from utils import parse_snapshot
 
 
+# Compiled once; the helpers below run per course on every grades view.
+_RE_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+_RE_GRADE_SEP = re.compile(r"[\s(),;]+")
+_RE_YEAR = re.compile(r"(19|20)\d{2}")
+
+
 # ====== Course Credits & GPA Data ======
 
+# Units per normalized course code (see _norm_course_code).
+COURSE_CREDITS: Dict[str, int] = {
+    'ALC099': 0, 'ALC101': 0, 'ARCH100': 3, 'ARCH131': 3,
+    'BISC100': 4, 'BISC101': 4, 'BISC102': 4, 'BPK140': 3,
+    'BUS108': 0, 'BUS200': 3, 'BUS216': 3, 'BUS251': 3,
+    'CA135': 3, 'CA149': 3, 'CHEM111': 4, 'CHEM121': 4,
+    'CHEM122': 2, 'CHEM126': 2, 'CMNS110': 3, 'CMNS120': 3,
+    'CMNS130': 3, 'CMPT115': 3, 'CMPT120': 3, 'CMPT125': 3,
+    'CMPT130': 3, 'CMPT135': 3, 'CNQS101': 0, 'CNST101': 0,
+    'CNSU101': 0, 'COM001': 0, 'COM002': 0, 'CRIM101': 3,
+    'CRIM131': 3, 'CRIM135': 3, 'ECN100': 0, 'ECON103': 4,
+    'ECON1034': 4, 'ECON1054': 4, 'ECON105': 4, 'ECON260': 3,
+    'ENF100': 0, 'ENGL112': 3, 'ENGL113': 3, 'ENGL115': 3,
+    'ENSC100': 3, 'ENSC105': 3, 'ENSC180': 3, 'EVSC100': 3,
+    'FREN120': 3, 'GEOG100': 3, 'GEOG104': 3, 'GSWS101': 3,
+    'HIST102': 3, 'HIST204': 3, 'HSCI160': 3, 'IAT100': 3,
+    'IAT102': 3, 'IAT110': 3, 'ILS101': 0, 'INDG101': 3,
+    'INDG201': 3, 'INDG286': 3, 'INS101': 0, 'INS102': 0,
+    'INTG100': 0, 'IS101': 3, 'IUW100': 0, 'LBST101': 3,
+    'LBST201': 3, 'LING110': 3, 'LING111': 3, 'LING200': 3,
+    'LING220': 3, 'MACM101': 3, 'MATH100': 3, 'MATH151': 3,
+    'MATH152': 3, 'MATH157': 3, 'MATH232': 3, 'MTH099': 0,
+    'MTH101': 0, 'MTH103': 0, 'PHIL105': 3, 'PHL120': 0,
+    'PHYS100': 3, 'PHYS140': 4, 'PHYS1141': 1, 'PHYS141': 4,
+    'POL100': 3, 'POL141': 3, 'POL151': 3, 'POL231': 3,
+    'POL232': 3, 'PSYC100': 3, 'PSYC102': 3, 'PSYC109': 3,
+    'PSYC201': 4, 'PSYC250': 3, 'PWR101': 0, 'REM100': 3,
+    'SA150': 4, 'STAT203': 3, 'UNI101': 0, 'WIS100': 0,
+    'WL101': 3, 'WL201': 3,
+}
+
+
 def get_course_credits(course_code: str) -> int:
     """Return the unit/credit value for a course code.
 
     Unknown courses default to 0 (won't affect GPA). If you want every course to
-    count correctly, keep this mapping up to date.
+    count correctly, keep COURSE_CREDITS up to date.
     """
-    courses = {
-        'ALC099': 0, 'ALC101': 0, 'ARCH100': 3, 'ARCH131': 3,
-        'BISC100': 4, 'BISC101': 4, 'BISC102': 4, 'BPK140': 3,
-        'BUS108': 0, 'BUS200': 3, 'BUS216': 3, 'BUS251': 3,
-        'CA135': 3, 'CA149': 3, 'CHEM111': 4, 'CHEM121': 4,
-        'CHEM122': 2, 'CHEM126': 2, 'CMNS110': 3, 'CMNS120': 3,
-        'CMNS130': 3, 'CMPT115': 3, 'CMPT120': 3, 'CMPT125': 3,
-        'CMPT130': 3, 'CMPT135': 3, 'CNQS101': 0, 'CNST101': 0,
-        'CNSU101': 0, 'COM001': 0, 'COM002': 0, 'CRIM101': 3,
-        'CRIM131': 3, 'CRIM135': 3, 'ECN100': 0, 'ECON103': 4,
-        'ECON1034': 4, 'ECON1054': 4, 'ECON105': 4, 'ECON260': 3,
-        'ENF100': 0, 'ENGL112': 3, 'ENGL113': 3, 'ENGL115': 3,
-        'ENSC100': 3, 'ENSC105': 3, 'ENSC180': 3, 'EVSC100': 3,
-        'FREN120': 3, 'GEOG100': 3, 'GEOG104': 3, 'GSWS101': 3,
-        'HIST102': 3, 'HIST204': 3, 'HSCI160': 3, 'IAT100': 3,
-        'IAT102': 3, 'IAT110': 3, 'ILS101': 0, 'INDG101': 3,
-        'INDG201': 3, 'INDG286': 3, 'INS101': 0, 'INS102': 0,
-        'INTG100': 0, 'IS101': 3, 'IUW100': 0, 'LBST101': 3,
-        'LBST201': 3, 'LING110': 3, 'LING111': 3, 'LING200': 3,
-        'LING220': 3, 'MACM101': 3, 'MATH100': 3, 'MATH151': 3,
-        'MATH152': 3, 'MATH157': 3, 'MATH232': 3, 'MTH099': 0,
-        'MTH101': 0, 'MTH103': 0, 'PHIL105': 3, 'PHL120': 0,
-        'PHYS100': 3, 'PHYS140': 4, 'PHYS1141': 1, 'PHYS141': 4,
-        'POL100': 3, 'POL141': 3, 'POL151': 3, 'POL231': 3,
-        'POL232': 3, 'PSYC100': 3, 'PSYC102': 3, 'PSYC109': 3,
-        'PSYC201': 4, 'PSYC250': 3, 'PWR101': 0, 'REM100': 3,
-        'SA150': 4, 'STAT203': 3, 'UNI101': 0, 'WIS100': 0,
-        'WL101': 3, 'WL201': 3,
-    }
-    return courses.get(course_code, 0)
+    return COURSE_CREDITS.get(course_code, 0)
 
 
 # SFU standard numeric equivalents (Spring 2026).
@@ -95,7 +105,7 @@ def _norm_course_code(code: str) -> str:
     if not code:
         return ""
     # Keep only letters/numbers, remove spaces and punctuation.
-    return re.sub(r"[^A-Z0-9]", "", code.upper().strip())
+    return _RE_NON_ALNUM.sub("", code.upper().strip())
 
 
 def _norm_grade(grade: str) -> str:
@@ -113,13 +123,12 @@ def _norm_grade(grade: str) -> str:
     g = g.replace("−", "-")  # unicode minus
 
     # Keep first token before whitespace or punctuation.
-    g = re.split(r"[\s(),;]+", g)[0].strip()
+    g = _RE_GRADE_SEP.split(g)[0].strip()
     return g
 
 
-def grade_to_points(grade: str) -> Optional[float]:
-    """Return numeric equivalent for a grade, or None if excluded from GPA."""
-    g = _norm_grade(grade)
+def _points_for_norm_grade(g: str) -> Optional[float]:
+    """grade_to_points() for a grade already passed through _norm_grade()."""
     if not g:
         return None
     if g in NON_GPA_GRADES:
@@ -127,6 +136,11 @@ def grade_to_points(grade: str) -> Optional[float]:
     return GRADE_POINTS.get(g)
 
 
+def grade_to_points(grade: str) -> Optional[float]:
+    """Return numeric equivalent for a grade, or None if excluded from GPA."""
+    return _points_for_norm_grade(_norm_grade(grade))
+
+
 _TERM_ORDER = {
     "WINTER": 0,
     "SPRING": 1,
@@ -135,8 +149,9 @@ _TERM_ORDER = {
 }
 
 
+@lru_cache(maxsize=256)
 def _term_sort_key(term_label: str) -> tuple:
-    """Best-effort chronological sort for term labels.
+    """Best-effort chronological sort for term labels (memoized; few distinct labels).
 
     Supports labels like:
       - "Spring 2026"
@@ -146,7 +161,7 @@ def _term_sort_key(term_label: str) -> tuple:
     s = (term_label or "").upper()
 
     # Find a year anywhere in the label.
-    m = re.search(r"(19|20)\d{2}", s)
+    m = _RE_YEAR.search(s)
     year = int(m.group(0)) if m else 0
 
     term_rank = 99
@@ -161,6 +176,20 @@ def _term_sort_key(term_label: str) -> tuple:
 
 # ====== FIC Message Formatting ======
 
+class _Attempt(NamedTuple):
+    """One course attempt in the GPA report."""
+    sem: str
+    sem_index: int
+    pos: int
+    attempt_key: Tuple[int, int]  # stable "most recent" ordering
+    code_raw: str
+    code_norm: str
+    grade_raw: str
+    grade_norm: str
+    points: Optional[float]
+    credits: int
+
+
 def format_grades_compact(grades_map: Dict[str, Dict[str, str]]) -> str:
     if not grades_map:
         return "No saved grades yet. Press “Force refresh” to fetch."
@@ -194,46 +223,52 @@ def format_gpa_report_compact(grades_map: Dict[str, Dict[str, str]]) -> str:
 
     # ---- Flatten attempts in chronological order ----
     # attempt_key provides a stable “most recent” ordering.
-    attempts: List[dict] = []
+    attempts: List[_Attempt] = []
+    attempts_by_sem: Dict[str, List[_Attempt]] = {}
     for sem_index, sem in enumerate(sems):
         inner = grades_map.get(sem) or {}
+        term_attempts = attempts_by_sem[sem] = []
         # stable ordering inside term
         for pos, (code_raw, grade_raw) in enumerate(sorted(inner.items(), key=lambda x: x[0])):
             code_norm = _norm_course_code(code_raw)
             cr = get_course_credits(code_norm)
-            pt = grade_to_points(grade_raw)
-            attempts.append({
-                "sem": sem,
-                "sem_index": sem_index,
-                "pos": pos,
-                "attempt_key": (sem_index, pos),
-                "code_raw": code_raw,
-                "code_norm": code_norm,
-                "grade_raw": (grade_raw or "").strip(),
-                "points": pt,
-                "credits": cr,
-            })
+            grade_norm = _norm_grade(grade_raw)
+            pt = _points_for_norm_grade(grade_norm)
+            a = _Attempt(
+                sem=sem,
+                sem_index=sem_index,
+                pos=pos,
+                attempt_key=(sem_index, pos),
+                code_raw=code_raw,
+                code_norm=code_norm,
+                grade_raw=(grade_raw or "").strip(),
+                grade_norm=grade_norm,
+                points=pt,
+                credits=cr,
+            )
+            attempts.append(a)
+            term_attempts.append(a)
 
     # ---- Pick the included attempt per course (highest grade; tie -> most recent) ----
     included_attempt_key_by_code: Dict[str, tuple] = {}
     best_points_by_code: Dict[str, float] = {}
 
     for a in attempts:
-        code = a["code_norm"]
-        pt = a["points"]
+        code = a.code_norm
+        pt = a.points
         if not code or pt is None:
             continue
 
         if code not in best_points_by_code:
             best_points_by_code[code] = pt
-            included_attempt_key_by_code[code] = a["attempt_key"]
+            included_attempt_key_by_code[code] = a.attempt_key
             continue
 
         best_pt = best_points_by_code[code]
         best_key = included_attempt_key_by_code[code]
-        if (pt > best_pt) or (pt == best_pt and a["attempt_key"] > best_key):
+        if (pt > best_pt) or (pt == best_pt and a.attempt_key > best_key):
             best_points_by_code[code] = pt
-            included_attempt_key_by_code[code] = a["attempt_key"]
+            included_attempt_key_by_code[code] = a.attempt_key
 
     # ---- Compute term GPA (after repeat exclusions) and cumulative GPA ----
     total_points = 0.0
@@ -245,14 +280,14 @@ def format_gpa_report_compact(grades_map: Dict[str, Dict[str, str]]) -> str:
 
         lines.append(f"\n🗓 <b>{sem}</b>")
 
-        term_attempts = [a for a in attempts if a["sem"] == sem]
-        term_attempts.sort(key=lambda x: x["code_norm"])  # show in code order
+        term_attempts = attempts_by_sem[sem]
+        term_attempts.sort(key=lambda x: x.code_norm)  # show in code order
 
         for a in term_attempts:
-            code_disp = a["code_raw"]
-            grade_disp = a["grade_raw"] or "—"
-            cr = a["credits"]
-            pt = a["points"]
+            code_disp = a.code_raw
+            grade_disp = a.grade_raw or "—"
+            cr = a.credits
+            pt = a.points
 
             # No grade / not in GPA (no numeric equivalent)
             if pt is None:
@@ -260,7 +295,7 @@ def format_gpa_report_compact(grades_map: Dict[str, Dict[str, str]]) -> str:
                 continue
 
             # Defensive: unknown grade token -> not in GPA
-            if _norm_grade(grade_disp) not in GRADE_POINTS:
+            if a.grade_norm not in GRADE_POINTS:
                 lines.append(f"  • {code_disp} ({cr} cr): {grade_disp} ⏭")
                 continue
 
@@ -269,7 +304,7 @@ def format_gpa_report_compact(grades_map: Dict[str, Dict[str, str]]) -> str:
                 lines.append(f"  • {code_disp} ({cr} cr): {grade_disp} ⏭")
                 continue
 
-            included = included_attempt_key_by_code.get(a["code_norm"]) == a["attempt_key"]
+            included = included_attempt_key_by_code.get(a.code_norm) == a.attempt_key
             tag = "" if included else "🚫"
             lines.append(f"  • {code_disp} ({cr} cr): {grade_disp} {tag}")
 
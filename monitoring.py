@@ -1,18 +1,25 @@
 # monitoring.py
-"""Background monitoring loops.
+"""Background monitoring.
 
 Only FIC monitoring is kept. Moodle monitoring was removed.
+
+A single scheduler task keeps a min-heap of (due time, user_id) and starts a
+bounded number of concurrent checks; each check reschedules its user.
 """
 
 import asyncio
 import contextlib
+import functools
+import heapq
+import logging
+import math
+import random
 import time
-from typing import Dict
+from typing import Dict, List, Set, Tuple
 
-import aiosqlite
 from aiogram import Bot
 
-from config import fernet, CHECK_INTERVAL_SEC, NOTIF_DURATION_DAYS, NOTIF_WARN_BEFORE_DAYS
+from config import CHECK_INTERVAL_SEC, MAX_CHECK_INTERVAL_SEC, MAX_CONCURRENT_CHECKS, NOTIF_DURATION_DAYS, NOTIF_WARN_BEFORE_SEC
 import database as db
 import messages
 from grades_service import GradesService
@@ -20,18 +27,56 @@ from playwright_manager import get_playwright_instance
 from utils import normalize_snapshot, compute_hash, _localize_known_error
 
 
-# Global task registry to manage running monitors
+# Checks currently running, at most one per user
 fic_monitor_tasks: Dict[int, asyncio.Task] = {}
 
+# Scheduler state. `_due` holds each scheduled user's current due time
+# (time.monotonic()); heap entries that no longer match it are stale and skipped.
+_heap: List[Tuple[float, int]] = []
+_due: Dict[int, float] = {}
+_unchanged_checks: Dict[int, int] = {}
+_wakeup = asyncio.Event()
+_check_slots = asyncio.Semaphore(MAX_CONCURRENT_CHECKS)
+_scheduler_task: asyncio.Task | None = None
+# Notification sends still in flight; referenced here until they finish.
+_pending_sends: Set[asyncio.Task] = set()
+
+# Each unchanged check stretches the next interval by this factor, up to
+# MAX_BACKOFF_FACTOR x CHECK_INTERVAL_SEC (and never past MAX_CHECK_INTERVAL_SEC).
+BACKOFF_STEP = 1.25
+MAX_BACKOFF_FACTOR = 4.0
+# Past this many unchanged checks the factor is capped anyway; clamping the
+# exponent keeps BACKOFF_STEP ** n from overflowing on long-idle users.
+_MAX_BACKOFF_EXP = math.ceil(math.log(MAX_BACKOFF_FACTOR, BACKOFF_STEP))
+# +/- 20% so monitors started together drift apart instead of polling in lockstep.
+POLL_JITTER = 0.2
+# How long stop_monitoring() lets pending notification sends finish.
+SEND_DRAIN_TIMEOUT_SEC = 5.0
+
+
+def _next_poll_delay(unchanged_checks: int) -> float:
+    """Seconds until the next check, backed off while grades stay unchanged."""
+    delay = CHECK_INTERVAL_SEC * min(MAX_BACKOFF_FACTOR, BACKOFF_STEP ** min(unchanged_checks, _MAX_BACKOFF_EXP))
+    delay = min(delay, max(CHECK_INTERVAL_SEC, MAX_CHECK_INTERVAL_SEC))
+    return delay * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
 
-async def _enforce_fic_expiry(bot: Bot, user_id: int, user: dict) -> bool:
-    """Return True if notifications are still active, otherwise disable and notify user."""
-    # Ensure expiry timestamp exists (for users from older DBs).
-    if user.get("fic_active") and not user.get("fic_active_until"):
-        await db.ensure_fic_until_set(user_id)
-        user = await db.get_user(user_id) or user
 
-    until_ts = user.get("fic_active_until")
+def _on_send_done(t: asyncio.Task) -> None:
+    _pending_sends.discard(t)
+    if not t.cancelled() and t.exception() is not None:
+        logging.warning("Failed to send notification: %s", t.exception())
+
+
+def _send_in_background(bot: Bot, user_id: int, text: str) -> None:
+    """Send a notification without making the check wait on Telegram."""
+    t = asyncio.create_task(bot.send_message(user_id, text, parse_mode="HTML"))
+    _pending_sends.add(t)
+    t.add_done_callback(_on_send_done)
+
+
+async def _enforce_fic_expiry(bot: Bot, user_id: int, user: db.UserRow) -> bool:
+    """Return True if notifications are still active, otherwise disable and notify user."""
+    until_ts = user.fic_active_until
     if not until_ts:
         # Should not happen for new DBs, but keep the bot resilient.
         return True
@@ -42,111 +87,194 @@ async def _enforce_fic_expiry(bot: Bot, user_id: int, user: dict) -> bool:
     # Expired -> auto disable
     if remaining <= 0:
         await db.set_fic_active(user_id, False)
-        await bot.send_message(
+        _send_in_background(
+            bot,
             user_id,
             "🔕 <b>Notifications turned off automatically.</b>\n\n"
             f"Notifications can stay enabled for <b>{NOTIF_DURATION_DAYS} days</b> only. "
             "You can enable them again in Settings.",
-            parse_mode="HTML",
         )
         return False
 
     # Warn before expiry (default: 1 day)
-    warn_window = max(0, int(NOTIF_WARN_BEFORE_DAYS)) * 86400
-    if warn_window > 0 and remaining <= warn_window and not bool(user.get("fic_warned") or 0):
+    if NOTIF_WARN_BEFORE_SEC > 0 and remaining <= NOTIF_WARN_BEFORE_SEC and not user.fic_warned:
         # Days left, shown as 1 when under 24h remains.
         days_left = db.fic_notif_days_left(user) or 0
-        await bot.send_message(
+        _send_in_background(
+            bot,
             user_id,
             "⏳ <b>Reminder</b>\n\n"
             f"Notifications will be turned off in <b>{days_left}</b> day{'s' if days_left != 1 else ''}.\n"
             f"(They can stay enabled for <b>{NOTIF_DURATION_DAYS} days</b> only.)",
-            parse_mode="HTML",
         )
         await db.set_fic_warned(user_id, True)
 
     return True
 
 
-async def monitor_fic_loop(bot: Bot, user_id: int) -> None:
+async def check_fic_user(bot: Bot, user_id: int) -> float | None:
+    """Run one monitoring check; return seconds until the next one, or None to stop."""
     # Fast path: if notifications are already off/expired, do not spin up Playwright.
-    user = await db.get_user(user_id)
-    if not user or not bool(user.get("fic_active", 0)):
-        return
+    user = await db.get_user_notif(user_id)
+    if not user or not user.fic_active:
+        return None
+
+    # Auto-off & warning logic
     if not await _enforce_fic_expiry(bot, user_id, user):
-        return
+        return None
+
+    # Cached by database.py until the credentials change.
+    creds = await db.get_credentials(user_id)
+    if creds is None:
+        return None
+    login, password = creds
 
     shared_pw = await get_playwright_instance()
     svc = GradesService(shared_pw=shared_pw)
-
     try:
-        while True:
-            user = await db.get_user(user_id)
-            if not user or not bool(user.get("fic_active", 0)):
-                break
-
-            # Auto-off & warning logic
-            if not await _enforce_fic_expiry(bot, user_id, user):
-                break
-
-            login = fernet.decrypt(user["login_enc"]).decode()
-            password = fernet.decrypt(user["password_enc"]).decode()
-
-            try:
-                grades_map = await svc.fic_final_grades(login, password)
-                await db.set_fic_error(user_id, None)
-            except Exception as e:
-                await db.set_fic_error(user_id, _localize_known_error(str(e)))
-                await asyncio.sleep(CHECK_INTERVAL_SEC)
-                continue
-
-            snapshot_json = normalize_snapshot(grades_map)
-            h = compute_hash(snapshot_json)
-            state = await db.get_fic_state(user_id)
-            last_hash = state.get("last_hash")
-
-            if not last_hash:
-                await db.update_fic_snapshot(user_id, snapshot_json, h)
-            elif h != last_hash:
-                changes = messages.find_new_or_changed_fic_grades(
-                    state.get("last_snapshot"),
-                    grades_map,
-                )
-                await db.update_fic_snapshot(user_id, snapshot_json, h)
-                if changes:
-                    msg = messages.format_fic_new_grade_notification(changes)
-                    await bot.send_message(user_id, msg, parse_mode="HTML")
-
-            await asyncio.sleep(CHECK_INTERVAL_SEC)
-
-    except asyncio.CancelledError:
-        pass
+        grades_map = await svc.fic_final_grades(login, password)
     except Exception as e:
-        await db.set_fic_error(user_id, f"Monitor error: {e}")
+        await db.set_fic_error(user_id, _localize_known_error(str(e)))
+        return _next_poll_delay(0)
     finally:
         try:
             await svc.close()
         except Exception:
             # Playwright may already be closed during shutdown.
             pass
-        fic_monitor_tasks.pop(user_id, None)
+
+    snapshot_json = normalize_snapshot(grades_map)
+    h = compute_hash(snapshot_json)
+    # Read after the fetch: a manual refresh may have stored a newer snapshot meanwhile.
+    state = await db.get_fic_state(user_id)
+    last_hash = state.get("last_hash")
+
+    if h == last_hash:
+        _unchanged_checks[user_id] = min(_unchanged_checks.get(user_id, 0) + 1, _MAX_BACKOFF_EXP)
+        # Nothing new to store: clear a previous error and stamp the check time.
+        await db.set_fic_error(user_id, None)
+    else:
+        _unchanged_checks[user_id] = 0
+        changes = None
+        if last_hash:
+            changes = messages.find_new_or_changed_fic_grades(
+                state.get("last_snapshot"),
+                grades_map,
+            )
+        # The snapshot upsert clears last_error too, so this is the only write.
+        await db.update_fic_snapshot(user_id, snapshot_json, h)
+        if changes:
+            msg = messages.format_fic_new_grade_notification(changes)
+            _send_in_background(bot, user_id, msg)
+
+    return _next_poll_delay(_unchanged_checks[user_id])
+
+
+async def _run_check(bot: Bot, user_id: int) -> None:
+    delay: float | None = None
+    try:
+        delay = await check_fic_user(bot, user_id)
+    except Exception as e:
+        await db.set_fic_error(user_id, f"Monitor error: {e}")
+        delay = _next_poll_delay(0)
+
+    if delay is None:
+        _unchanged_checks.pop(user_id, None)
+    else:
+        _schedule(user_id, delay)
+
+
+def _on_check_done(user_id: int, t: asyncio.Task) -> None:
+    # Runs even when the check is cancelled before its first step, which a
+    # `finally` inside _run_check would miss, leaking the slot and the entry.
+    _check_slots.release()
+    if fic_monitor_tasks.get(user_id) is t:
+        del fic_monitor_tasks[user_id]
+
+
+def _schedule(user_id: int, delay: float) -> None:
+    due = time.monotonic() + delay
+    _due[user_id] = due
+    heapq.heappush(_heap, (due, user_id))
+    _wakeup.set()
+
+
+async def _run_scheduler(bot: Bot) -> None:
+    """Single sweeper: sleep until the earliest due user, then start its check."""
+    while True:
+        _wakeup.clear()
+        if not _heap:
+            await _wakeup.wait()
+            continue
+
+        due, user_id = _heap[0]
+        delay = due - time.monotonic()
+        if delay > 0:
+            # Wake early if a user is (re)scheduled ahead of the current head.
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+            continue
+
+        heapq.heappop(_heap)
+        if _due.get(user_id) != due:
+            continue  # superseded or unscheduled
+
+        await _check_slots.acquire()
+        if _due.get(user_id) != due:
+            # Unscheduled while waiting for a free slot.
+            _check_slots.release()
+            continue
+        del _due[user_id]
+        t = asyncio.create_task(_run_check(bot, user_id))
+        t.add_done_callback(functools.partial(_on_check_done, user_id))
+        fic_monitor_tasks[user_id] = t
+
+
+def _ensure_scheduler(bot: Bot) -> None:
+    global _scheduler_task
+    if _scheduler_task is None or _scheduler_task.done():
+        _scheduler_task = asyncio.create_task(_run_scheduler(bot))
 
 
 def ensure_fic_task(bot: Bot, user_id: int) -> None:
-    """Start (or keep) a running monitoring task for the user."""
-    if user_id in fic_monitor_tasks and not fic_monitor_tasks[user_id].done():
+    """Schedule an immediate check for the user unless one is already scheduled or running."""
+    _ensure_scheduler(bot)
+    if user_id in _due or user_id in fic_monitor_tasks:
         return
-    fic_monitor_tasks[user_id] = asyncio.create_task(monitor_fic_loop(bot, user_id))
+    _schedule(user_id, 0)
+
+
+async def stop_fic_task(user_id: int) -> None:
+    """Unschedule the user and cancel a check that is currently running."""
+    _due.pop(user_id, None)
+    _unchanged_checks.pop(user_id, None)
+    await cancel_task_safely(fic_monitor_tasks.get(user_id))
 
 
 async def resume_tasks_on_start(bot: Bot) -> None:
     """On bot startup, restore monitoring tasks for users who have it enabled."""
+    # Backfill expiry timestamps for users from older DBs in one statement.
+    await db.ensure_fic_until_set_bulk()
     async with db.get_db() as conn:
-        conn.row_factory = aiosqlite.Row
-        async with conn.execute("SELECT user_id, fic_active FROM users") as cur:
-            async for row in cur:
-                if row["fic_active"]:
-                    ensure_fic_task(bot, row["user_id"])
+        async with conn.execute(db.SELECT_ACTIVE_USER_IDS) as cur:
+            rows = await cur.fetchall()
+    for row in rows:
+        ensure_fic_task(bot, row["user_id"])
+
+
+async def stop_monitoring() -> None:
+    """Cancel the scheduler and all running checks, then wait for them to finish."""
+    tasks = list(fic_monitor_tasks.values())
+    if _scheduler_task is not None:
+        tasks.append(_scheduler_task)
+    for t in tasks:
+        if not t.done():
+            t.cancel()
+    if tasks:
+        await asyncio.wait(tasks, return_when=asyncio.ALL_COMPLETED)
+    # Let already-queued notifications go out before the bot session closes.
+    if _pending_sends:
+        await asyncio.wait(set(_pending_sends), timeout=SEND_DRAIN_TIMEOUT_SEC)
 
 
 async def cancel_task_safely(t: asyncio.Task | None) -> None:
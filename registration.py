@@ -8,8 +8,10 @@ from aiogram.types import Message, CallbackQuery
 
 import keyboards
 import database as db
+from common import _field, invalidate_notifications_line
+from constants import MAIN_MENU_HEADER, MAIN_MENU_FOOTER
 from grades_service import GradesService
-from monitoring import ensure_fic_task, cancel_task_safely, fic_monitor_tasks
+from monitoring import ensure_fic_task, stop_fic_task
 from playwright_manager import get_playwright_instance
 from utils import safe_edit, _localize_known_error, format_dt_vancouver
 from config import NOTIF_DURATION_DAYS
@@ -33,10 +35,10 @@ async def cancel_creds_flow(message: Message, state: FSMContext):
         fic_st = await db.get_fic_state(uid)
         await message.answer(
             "✅ Cancelled.\n\n"
-            "🏠 <b>Main menu</b>\n"
-            f"<b>FIC:</b> {'on 🔔' if rec.get('fic_active') else 'off 🔕'} | "
-            f"Update: {format_dt_vancouver((fic_st or {}).get('updated_at'))}\n\n"
-            "<b>Choose a section:</b>",
+            + MAIN_MENU_HEADER
+            + f"<b>FIC:</b> {'on 🔔' if rec.get('fic_active') else 'off 🔕'} | "
+            f"Update: {format_dt_vancouver(_field(fic_st, 'updated_at'))}\n"
+            + MAIN_MENU_FOOTER,
             reply_markup=keyboards.kb_main_menu(),
         )
     else:
@@ -107,6 +109,7 @@ async def got_password(message: Message, state: FSMContext, bot: Bot):
 
     await progress_msg.edit_text("✅ OK. Saving…")
     await db.save_credentials(uid, login, password)
+    invalidate_notifications_line(uid)
     await state.clear()
 
     rec = await db.get_user(uid)
@@ -120,16 +123,16 @@ async def got_password(message: Message, state: FSMContext, bot: Bot):
         )
     else:  # change
         if rec and rec.get("fic_active"):
-            await cancel_task_safely(fic_monitor_tasks.get(uid))
+            await stop_fic_task(uid)
             ensure_fic_task(bot, uid)
         await bot.send_message(message.chat.id, "🔐 <b>Credentials updated.</b>")
 
     fic_st = await db.get_fic_state(uid)
     await bot.send_message(
         message.chat.id,
-        "🏠 <b>Main menu</b>\n"
-        f"<b>FIC:</b> {'on 🔔' if rec and rec.get('fic_active') else 'off 🔕'} | "
-        f"Update: {format_dt_vancouver(fic_st.get('updated_at'))}\n\n"
-        "<b>Choose a section:</b>",
+        MAIN_MENU_HEADER
+        + f"<b>FIC:</b> {'on 🔔' if rec and rec.get('fic_active') else 'off 🔕'} | "
+        f"Update: {format_dt_vancouver(_field(fic_st, 'updated_at'))}\n"
+        + MAIN_MENU_FOOTER,
         reply_markup=keyboards.kb_main_menu(),
     )
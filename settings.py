@@ -6,7 +6,8 @@ from aiogram.types import Message, CallbackQuery
 
 import keyboards
 import database as db
-from monitoring import fic_monitor_tasks, ensure_fic_task, cancel_task_safely
+from common import _field, invalidate_notifications_line
+from monitoring import ensure_fic_task, stop_fic_task
 from registration import Creds
 from utils import safe_edit, format_dt_vancouver
 from config import NOTIF_DURATION_DAYS
@@ -15,16 +16,13 @@ router = Router()
 
 
 async def build_notifications_panel(uid: int) -> str:
-    # Older DBs may not have an expiry timestamp yet; set it lazily so UI is accurate.
-    await db.ensure_fic_until_set(uid)
-    rec = await db.get_user(uid)
-    fic_st = await db.get_fic_state(uid)
-    fic_on = bool(rec and rec.get("fic_active"))
+    rec, fic_st = await db.get_user_notif_with_fic_state(uid) or (None, None)
+    fic_on = bool(rec and rec.fic_active)
     left = db.fic_notif_days_left(rec) if fic_on else None
     tail = f" (auto-off in {left} day{'s' if left != 1 else ''})" if fic_on and left is not None else ""
     return (
         f"<b>FIC:</b> {'on 🔔' if fic_on else 'off 🔕'}{tail} | "
-        f"Update: {format_dt_vancouver((fic_st or {}).get('updated_at'))}\n"
+        f"Update: {format_dt_vancouver(_field(fic_st, 'updated_at'))}\n"
     )
 
 
@@ -79,8 +77,9 @@ async def cb_reset_yes(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     uid = callback.from_user.id
 
-    await cancel_task_safely(fic_monitor_tasks.get(uid))
+    await stop_fic_task(uid)
     await db.delete_user_data(uid)
+    invalidate_notifications_line(uid)
     await state.clear()
 
     await safe_edit(callback.message, text="✅ <b>Done.</b> Settings have been reset.", reply_markup=None)
@@ -113,6 +112,7 @@ async def cb_notif_fic_on(callback: CallbackQuery, bot: Bot):
     await callback.answer()
     uid = callback.from_user.id
     await db.set_fic_active(uid, True)
+    invalidate_notifications_line(uid)
     ensure_fic_task(bot, uid)
     await _refresh_notif_panel(callback)
 
@@ -122,13 +122,15 @@ async def cb_notif_fic_off(callback: CallbackQuery):
     await callback.answer()
     uid = callback.from_user.id
     await db.set_fic_active(uid, False)
-    await cancel_task_safely(fic_monitor_tasks.get(uid))
+    invalidate_notifications_line(uid)
+    await stop_fic_task(uid)
     await _refresh_notif_panel(callback)
 
 
 @router.message(Command("delete"))
 async def cmd_delete(message: Message):
     uid = message.from_user.id
-    await cancel_task_safely(fic_monitor_tasks.get(uid))
+    await stop_fic_task(uid)
     await db.delete_user_data(uid)
+    invalidate_notifications_line(uid)
     await message.answer("🗑️ <b>Data deleted, notifications off.</b> Use /start to register again.")
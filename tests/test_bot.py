@@ -0,0 +1,68 @@
+import asyncio
+import os
+import unittest
+from types import SimpleNamespace
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("BOT_TOKEN", "test")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+
+from bot import ChatOrderMiddleware  # noqa: E402
+
+
+class ChatOrderMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.slots = 4  # aiogram's tasks_concurrency_limit
+        self.polling = asyncio.Semaphore(self.slots)
+        self.mw = ChatOrderMiddleware(self.slots)
+        self.tasks = []
+
+    async def asyncTearDown(self):
+        await self.mw.close()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def _feed(self, chat_id, handler, event):
+        # Mirrors Dispatcher._process_polling: a slot is taken before the
+        # update task starts and given back only when it finishes.
+        await self.polling.acquire()
+
+        async def run():
+            try:
+                await self.mw(handler, event, {"event_chat": SimpleNamespace(id=chat_id)})
+            finally:
+                self.polling.release()
+
+        self.tasks.append(asyncio.create_task(run()))
+
+    async def test_flooding_chat_does_not_starve_others(self):
+        release = asyncio.Event()
+        served = asyncio.Event()
+
+        async def slow(event, data):
+            await release.wait()
+
+        async def fast(event, data):
+            served.set()
+
+        for i in range(self.slots * 3):
+            await asyncio.wait_for(self._feed(1, slow, i), timeout=1)
+        await asyncio.wait_for(self._feed(2, fast, "other"), timeout=1)
+        await asyncio.wait_for(served.wait(), timeout=1)
+        release.set()
+
+    async def test_chat_updates_run_in_order(self):
+        seen = []
+
+        async def handler(event, data):
+            await asyncio.sleep(0.01 if event % 2 else 0)
+            seen.append(event)
+
+        for i in range(6):
+            await self._feed(1, handler, i)
+        await asyncio.sleep(0.2)
+        self.assertEqual(seen, list(range(6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
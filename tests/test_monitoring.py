@@ -0,0 +1,28 @@
+import os
+import unittest
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("BOT_TOKEN", "test")
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+
+import monitoring  # noqa: E402
+from config import CHECK_INTERVAL_SEC, MAX_CHECK_INTERVAL_SEC  # noqa: E402
+
+
+class NextPollDelayTest(unittest.TestCase):
+    def test_long_idle_user_stays_at_the_cap(self):
+        cap = min(CHECK_INTERVAL_SEC * monitoring.MAX_BACKOFF_FACTOR, max(CHECK_INTERVAL_SEC, MAX_CHECK_INTERVAL_SEC))
+        for n in (monitoring._MAX_BACKOFF_EXP, 3300, 10**6):
+            delay = monitoring._next_poll_delay(n)
+            self.assertLessEqual(delay, cap * (1 + monitoring.POLL_JITTER))
+            self.assertGreaterEqual(delay, cap * (1 - monitoring.POLL_JITTER))
+
+    def test_first_check_uses_base_interval(self):
+        delay = monitoring._next_poll_delay(0)
+        self.assertLessEqual(delay, CHECK_INTERVAL_SEC * (1 + monitoring.POLL_JITTER))
+        self.assertGreaterEqual(delay, CHECK_INTERVAL_SEC * (1 - monitoring.POLL_JITTER))
+
+
+if __name__ == "__main__":
+    unittest.main()
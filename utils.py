@@ -2,29 +2,40 @@
 from __future__ import annotations
 
 import hashlib
-import json
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 from zoneinfo import ZoneInfo
 
+import orjson
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup, Message
 
 
 def compute_hash(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    # Only ever compared with the previous stored value; after an algorithm
+    # change the first check just rewrites the snapshot (grades are diffed
+    # separately, so no spurious notification).
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=32).hexdigest()
 
 
 def normalize_snapshot(obj: dict) -> str:
-    """Stable JSON serialization for hashing/storage."""
-    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    """Stable JSON serialization for hashing/storage.
+
+    Byte-for-byte the same as json.dumps(ensure_ascii=False, sort_keys=True,
+    separators=(",", ":")), so stored snapshots still compare equal to fresh
+    ones and diffs stay stable. Stored hashes do not: compute_hash() changed to
+    BLAKE2b at the same time, so the first check of each user after the
+    upgrade rewrites its snapshot once (with no notification, as the diff of
+    the snapshots is empty).
+    """
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode("utf-8")
 
 
 def parse_snapshot(snapshot_json: Optional[str]) -> dict:
     if not snapshot_json:
         return {}
     try:
-        return json.loads(snapshot_json)
+        return orjson.loads(snapshot_json)
     except Exception:
         return {}
 